@@ -3,88 +3,70 @@ Apply scheduled temperature changes to climate entities. The climate_updates ser
 (at least on the local times indicated in the schedules). When the current local date/time matches a day pattern
 and time in the scedule, the corrsponding temperature is applied to all entities in the zone OR the vacation mode
 temperature if vacation mode is on. The service uses a different schedule depending on whether the HVAC mode of
-the first entity per zone is "heat" or "cool". (If it is neither, nothing happens.)
+the first entity per zone is "heat" or "cool". (If it is neither, nothing happens.) Zones and schedules are defined
+in climate_zones.yaml. Pyscript must be configured to expose the "hass" global variable and allow all imports so that
+the file can be loaded.
 """
 
 from enum import Enum
 from datetime import datetime
+import voluptuous as vol
+import definitions
+import profiling
 
-# Zones and climate entities.
-Zone = Enum("Zone", "UPSTAIRS DOWNSTAIRS MASTER_BEDROOM")
-# First entity deterines HVAC mode for each zone.
-ZONE_ENTITIES = {
-    Zone.UPSTAIRS: [
-        "climate.back_bedroom_mini_split",
-        "climate.front_bedroom_mini_split",
-    ],
-    Zone.DOWNSTAIRS: ["climate.living_room_mini_split", "climate.office_mini_split"],
-    Zone.MASTER_BEDROOM: ["climate.master_bedroom_mini_split"],
-}
+# Zones, their climate entities and their heat/cool schedules live in this YAML file in the pyscript folder.
+ZONES_FILE = "climate_zones.yaml"
 
 # Day of week patterns
 DayPattern = Enum("DayPattern", "ALL WEEKDAYS WEEKENDS")
 
-# Schedules. An automation calling the service must be triggered on these times. Otherwise, nothing will happen.
-HEAT_SCHEDULE = {
-    Zone.UPSTAIRS: {
-        # DayPattern.WEEKDAYS: {
-        #     "08:00": 65,
-        # },
-        DayPattern.ALL: {
-            "08:00": 68,
-            "14:00": 68,
-            "23:00": 66,
-        },
-    },
-    Zone.MASTER_BEDROOM: {
-        DayPattern.WEEKDAYS: {
-            "12:00": 68,
-        },
-        DayPattern.ALL: {
-            "10:00": 66,
-            "17:00": 64,
-        },
-    },
-    Zone.DOWNSTAIRS: {
-        DayPattern.ALL: {
-            "06:00": 67,
-            "22:30": 62,
-        },
-    },
-}
+# Time-temp schedules per day pattern. Times are local "HH:MM".
+SCHEDULE_SCHEMA = vol.Schema(
+    {vol.In([pattern.name for pattern in DayPattern]): {vol.Match(r"^([01]\d|2[0-3]):[0-5]\d$"): vol.Any(int, float)}}
+)
+
+ZONES_SCHEMA = vol.Schema(
+    {
+        str: {
+            vol.Required("entities"): vol.All([vol.Match(r"^climate\.")], vol.Length(min=1)),
+            vol.Optional("heat_schedule", default={}): SCHEDULE_SCHEMA,
+            vol.Optional("cool_schedule", default={}): SCHEDULE_SCHEMA,
+        }
+    }
+)
+
 VACATION_HEAT_TEMP = 62
+VACATION_COOL_TEMP = 78
 
 # Amount by which to increase/decrease target temp when oil heat is engaged/disenabled, respectively.
 # This is needed because the mini-split controller tends to let the boiler run colder than the requested temp.
 OIL_HEAT_BOOST = 2
 
-COOL_SCHEDULE = {
-    Zone.UPSTAIRS: {
-        # DayPattern.WEEKDAYS: {
-        #     "08:00": 77,
-        # },
-        DayPattern.ALL: {
-            "14:00": 75,
-            "23:00": 75,
-        },
-    },
-    Zone.MASTER_BEDROOM: {
-        DayPattern.ALL: {
-            "08:00": 74,
-            "21:30": 72,
-        },
-    },
-    Zone.DOWNSTAIRS: {
-        DayPattern.ALL: {
-            "07:00": 75,
-            "23:00": 78,
-        },
-    },
-}
-VACATION_COOL_TEMP = 78
+
+def _compile_zones(zone_defs):
+    """Convert validated zone definitions so that schedules are keyed by DayPattern rather than its name."""
+    return {
+        zone: {
+            "entities": zone_def["entities"],
+            "heat_schedule": {DayPattern[name]: times for name, times in zone_def["heat_schedule"].items()},
+            "cool_schedule": {DayPattern[name]: times for name, times in zone_def["cool_schedule"].items()},
+        }
+        for zone, zone_def in zone_defs.items()
+    }
+
+
+def _zones():
+    """Return the current zone definitions by zone name, loading them on first use."""
+    return definitions.get(ZONES_FILE, ZONES_SCHEMA, _compile_zones)
+
+
+@time_trigger("period(now, 30s)")
+def reload_climate_zones():
+    """Swap in edited zone definitions."""
+    definitions.reload_if_changed(ZONES_FILE, ZONES_SCHEMA, _compile_zones)
 
 
-def _apply_zone_temp(zone, zone_schedule, vacation_mode_temp, heat_boost, now):
+def _apply_zone_temp(zone_entities, zone_schedule, vacation_mode_temp, heat_boost, now):
     """Apply scheduled temperatute change for one zone.
 
     Check the current day of week against the day patterns in the zone schedule and if they match,
@@ -96,7 +78,7 @@ def _apply_zone_temp(zone, zone_schedule, vacation_mode_temp, heat_boost, now):
     temp is adjusted slightly higher to compensate for stubborn controller.
 
     Params:
-        zone: Name of top-most element from schedule structures.
+        zone_entities: Climate entity IDs in the zone.
         zone_schedule: Dict of day patterns (weekends, weekdays, etc.) to time-temp schedule.
         vacation_mode_temp: Override temperature value to set when vacation mode is enabled.
         heat_boost: If true, increase target temp by a small amount above the scheduled temp to
@@ -121,20 +103,21 @@ def _apply_zone_temp(zone, zone_schedule, vacation_mode_temp, heat_boost, now):
             else scheduled_temp
         )
         adjusted_temp = target_temp if not heat_boost else target_temp + OIL_HEAT_BOOST
-        climate.set_temperature(
-            entity_id=ZONE_ENTITIES[zone], temperature=adjusted_temp, blocking=True
+        profiling.call(
+            "climate", "set_temperature", entity_id=zone_entities, temperature=adjusted_temp, blocking=True
         )
-        log.info(f"Setting new temperature {adjusted_temp} on {ZONE_ENTITIES[zone]}.")
+        log.info(f"Setting new temperature {adjusted_temp} on {zone_entities}.")
 
 
 @service
+@profiling.profiled
 def climate_updates():
     """Update thermostats if necessary based on schedule."""
     now = datetime.now()
-    for zone in list(Zone):
+    for zone in _zones().values():
         # Pick one entity from each zone to determine if we're in "heat" or "cool" mode.
         # Assumption is that all units in a zone will be the same mode. Otherwise, weirdness.
-        sample_zone_entity = ZONE_ENTITIES[zone][0]
+        sample_zone_entity = zone["entities"][0]
         hvac_mode = state.get(sample_zone_entity)
         if hvac_mode == "heat":
             # When minisplits are idle in heat mode, we're using oil. But for some reason, the
@@ -143,16 +126,17 @@ def climate_updates():
             heat_boost = state.get(f"{sample_zone_entity}.hvac_action") == "idle"
             # Apply heat schedule.
             _apply_zone_temp(
-                zone, HEAT_SCHEDULE[zone], VACATION_HEAT_TEMP, heat_boost, now
+                zone["entities"], zone["heat_schedule"], VACATION_HEAT_TEMP, heat_boost, now
             )
         elif hvac_mode == "cool":
             # Apply cooling schedule.
             _apply_zone_temp(
-                zone, COOL_SCHEDULE[zone], VACATION_COOL_TEMP, False, now
+                zone["entities"], zone["cool_schedule"], VACATION_COOL_TEMP, False, now
             )
 
 
 @service
+@profiling.profiled
 def change_oil_heat_boost(entity_id, increasing):
     """Change relative temperature of an entity ID by the OIL_HEAT_BOOST value.
 
@@ -168,19 +152,21 @@ def change_oil_heat_boost(entity_id, increasing):
 
 
 @service
+@profiling.profiled
 def dial_temperature(zone_or_entity_id, degrees):
     """Change relative temperature for a zone or climate entity.
 
     Params:
-        zone_or_entity_id: Name of top-most element from zone entities structure OR a climate entity ID.
+        zone_or_entity_id: Name of a zone from the zones file OR a climate entity ID.
         degrees: Amount of change (integer). Positive increases temp, negative decreases.
     """
-    entities = ZONE_ENTITIES.get(Zone[zone_or_entity_id]) if zone_or_entity_id in [zone.name for zone in Zone] else [zone_or_entity_id]
+    zones = _zones()
+    entities = zones[zone_or_entity_id]["entities"] if zone_or_entity_id in zones else [zone_or_entity_id]
     for entity_id in entities:
         old_temp = state.get(f"{entity_id}.temperature")
         new_temp = old_temp + degrees
         if old_temp != new_temp:
-            climate.set_temperature(entity_id=entity_id, temperature=new_temp, blocking=True)
+            profiling.call("climate", "set_temperature", entity_id=entity_id, temperature=new_temp, blocking=True)
             direction = "Increasing" if old_temp < new_temp else "Decreasing"
             log.info(f"{direction} {entity_id} temperature from {old_temp} to {new_temp}.")
         else:
@@ -188,6 +174,7 @@ def dial_temperature(zone_or_entity_id, degrees):
 
 
 @service
+@profiling.profiled
 def set_all_hvac_mode(hvac_mode):
     """Change HVAC mode of all zone entities at once.
 
@@ -197,5 +184,5 @@ def set_all_hvac_mode(hvac_mode):
     Param:
         hvac_mode: HVAC mode such as 'off', 'cool', 'heat', etc.
     """
-    for zone_entities in ZONE_ENTITIES.values():
-        climate.set_hvac_mode(entity_id=zone_entities, hvac_mode=hvac_mode)
+    for zone in _zones().values():
+        profiling.call("climate", "set_hvac_mode", entity_id=zone["entities"], hvac_mode=hvac_mode)
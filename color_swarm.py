@@ -1,342 +1,88 @@
 """
-A collection of lighting effects that runs asynchronously on Philips Hue rooms/groups.
-Pyscript must be configured to expose the "hass" global variable and allow all imports
-so that we can access the Hue bridge configs and entity registry.
+A collection of lighting effects that runs asynchronously on Philips Hue rooms/groups. Effects are defined in
+swarms.yaml. Pyscript must be configured to expose the "hass" global variable and allow all imports
+so that we can load the definitions and access the Hue bridge configs and entity registry.
 """
-from aiohue import HueBridgeV2
-from aiohue.v2.models.resource import ResourceTypes
-from homeassistant.helpers import entity_registry as er
 import time
 import heapq
 import random
+import voluptuous as vol
+import definitions
+import hue_entertainment
+import light_dispatch
+import profiling
 
 
-# Swarm definitions. Add your own here. To favor a particular color, add multiple instances of it to the palette.
-# Max hold is the maximum number of seconds a bulb will hold its setting before transitioning to a new random color.
-# The other attributes are self-explanatory, I hope.
-swarms = {
-    "Christmas": {
-        "transition_secs": 10,
-        "max_hold_secs": 60,
-        "palette": [
-            {
-                "rgb_color": (255, 0, 0),
-                "brightness": 100,
-            },
-            {
-                "rgb_color": (0, 255, 0),
-                "brightness": 100,
-            },
-        ],
-    },
-    "Bright Christmas": {
-        "transition_secs": 1,
-        "max_hold_secs": 5,
-        "palette": [
-            {
-                "rgb_color": (255, 13, 24),
-                "brightness": 240,
-            },
-            {
-                "rgb_color": (255, 0, 0),
-                "brightness": 255,
-            },
-            {
-                "rgb_color": (0, 255, 0),
-                "brightness": 255,
-            },
-            {
-                "rgb_color": (21, 255, 13),
-                "brightness": 240,
-            },
-        ],
-    },
-    "Casino": {
-        "transition_secs": 10,
-        "max_hold_secs": 60,
-        "palette": [
-            {
-                # Magenta
-                "rgb_color": (255, 40, 230),
-                "brightness": 214,
-            },
-            {
-                # Blue
-                "rgb_color": (70, 82, 255),
-                "brightness": 145,
-            },
-            {
-                # Gold
-                "rgb_color": (255, 163, 49),
-                "brightness": 206,
-            },
-            {
-                # Lavender
-                "rgb_color": (115, 56, 255),
-                "brightness": 255,
-            },
-        ],
-    },
-    "Dim arcade": {
-        "transition_secs": 10,
-        "max_hold_secs": 60,
-        "palette": [
-            {
-                # White-ish
-                "rgb_color": (245, 215, 255),
-                "brightness": 88,
-            },
-            {
-                # Blue
-                "rgb_color": (64, 29, 255),
-                "brightness": 226,
-            },
-            {
-                # Red
-                "rgb_color": (255, 71, 44),
-                "brightness": 70,
-            },
-            {
-                # Purple
-                "rgb_color": (117, 12, 255),
-                "brightness": 130,
-            },
-        ],
-    },
-    "Neon sea": {
-        "transition_secs": 10,
-        "max_hold_secs": 60,
-        "palette": [
-            {
-                # Blue 1
-                "rgb_color": (65, 8, 255),
-                "brightness": 255,
-            },
-            {
-                # Blue 2
-                "rgb_color": (64, 10, 255),
-                "brightness": 255,
-            },
-            {
-                # Sea green
-                "rgb_color": (119, 255, 200),
-                "brightness": 255,
-            },
-        ],
-    },
-    "Ocean city": {
-        "transition_secs": 10,
-        "max_hold_secs": 60,
-        "palette": [
-            {
-                # White-ish
-                "rgb_color": (255, 246, 250),
-                "brightness": 96,
-            },
-            {
-                # Salmon
-                "rgb_color": (255, 171, 89),
-                "brightness": 130,
-            },
-            {
-                # Light blue
-                "rgb_color": (61, 125, 255),
-                "brightness": 120,
-            },
-            {
-                # Dark blue
-                "rgb_color": (63, 44, 255),
-                "brightness": 83,
-            },
-        ],
-    },
-    "Murder": {
-        "transition_secs": 1,
-        "max_hold_secs": 8,
-        "palette": [
-            {
-                "rgb_color": (255, 56, 18),
-                "brightness": 55,
-            },
-            {
-                "rgb_color": (255, 53, 4),
-                "brightness": 18,
-            },
-            {
-                "rgb_color": (255, 58, 21),
-                "brightness": 40,
-            },
-            {
-                "rgb_color": (255, 51, 0),
-                "brightness": 54,
-            },
-        ],
-    },
-    "Purple rain": {
-        "transition_secs": 1,
-        "max_hold_secs": 8,
-        "palette": [
-            {
-                "rgb_color": (153, 116, 255),
-                "brightness": 110,
-            },
-            {
-                "rgb_color": (195, 67, 255),
-                "brightness": 62,
-            },
-            {
-                "rgb_color": (163, 82, 255),
-                "brightness": 106,
-            },
-            {
-                "rgb_color": (152, 20, 255),
-                "brightness": 80,
-            },
-        ],
-    },
-    "Grad party": {
-        "transition_secs": 1,
-        "max_hold_secs": 30,
-        "palette": [
-            {
-                # Blackhawk (sorta)
-                "rgb_color": (64, 0, 255),
-                "brightness": 163,
-            },
-            {
-                # Gold
-                "rgb_color": (255, 205, 49),
-                "brightness": 240,
-            },
-        ]
-        + [
-            {
-                # White
-                "kelvin": 3200,
-                "brightness": 255,
-            },
-        ]
-        * 10,
-    },
-    "USA": {
-        "transition_secs": 3,
-        "max_hold_secs": 60,
-        "palette": [
-            {
-                "rgb_color": (255, 0, 0),
-                "brightness": 255,
-            },
-            {
-                "rgb_color": (0, 0, 255),
-                "brightness": 255,
-            },
-            {
-                "rgb_color": (255, 255, 255),
-                "brightness": 255,
-            },
-        ],
-    },
-    "Northern lights": {
-        "transition_secs": 1,
-        "max_hold_secs": 8,
-        "palette": [
-            {
-                "rgb_color": (23, 35, 71),
-                "brightness": 255,
-            },
-            {
-                "rgb_color": (2, 83, 133),
-                "brightness": 255,
-            },
-            {
-                "rgb_color": (14, 243, 197),
-                "brightness": 200,
-            },
-            {
-                "rgb_color": (4, 226, 183),
-                "brightness": 200,
-            },
-            {
-                "rgb_color": (3, 132, 152),
-                "brightness": 220,
-            },
-            {
-                "rgb_color": (1, 82, 104),
-                "brightness": 255,
-            },
-        ],
-    },
-    "Summer night": {
-        "transition_secs": 10,
-        "max_hold_secs": 60,
-        "palette": [
-            {
-                "rgb_color": (160, 82, 255),
-                "brightness": 28,
-            },
-            {
-                "rgb_color": (96, 84, 255),
-                "brightness": 1,
-            },
-        ],
-    },
-    "Candlelight": {
-        "transition_secs": 0.25,
-        "max_hold_secs": 4,
-        "palette": [
-            {
-                "color_temp": 2300,
-                "brightness": 22,
-            },
-            {
-                "color_temp": 2100,
-                "brightness": 48,
-            },
-            {
-                "color_temp": 2200,
-                "brightness": 67,
-            },
-            {
-                "color_temp": 3200,
-                "brightness": 42,
-            },
-            {
-                "color_temp": 1500,
-                "brightness": 22,
-            },
-            {
-                "color_temp": 4500,
-                "brightness": 70,
-            },
-        ],
-    },
-    "Velvet rose": {
-        "transition_secs": 10,
-        "max_hold_secs": 60,
-        "palette": [
-            {
-                "rgb_color": (255, 125, 162),
-                "brightness": 64,
-            },
-            {
-                "rgb_color": (255, 111, 169),
-                "brightness": 64,
-            },
-            {
-                "rgb_color": (239, 125, 255),
-                "brightness": 64,
-            },
-            {
-                "rgb_color": (255, 134, 116),
-                "brightness": 64,
-            },
-            {
-                "rgb_color": (255, 147, 185),
-                "brightness": 64,
-            },
-        ],
-    },
-}
+# Swarm definitions live in this YAML file in the pyscript folder. Edits are picked up by running swarms.
+SWARMS_FILE = "swarms.yaml"
+
+# Swarm engines. See color_swarm_turn_on.
+ENGINES = ["heap", "precomputed"]
+# Number of seconds of transitions generated at a time by the precomputed engine.
+PRECOMPUTE_BLOCK_SECS = 600
+# Number of seconds between checks whether an alert has released a light that a swarm is holding transitions for.
+CLAIM_RECHECK_SECS = 1
+
+# Entertainment streaming frame rate limits, in frames per second. The bridge applies at most about 25.
+DEFAULT_FRAME_RATE = 25
+MAX_FRAME_RATE = 60
+# Number of channels streamed to a stand-in bridge, which has no entertainment areas to look up.
+STAND_IN_CHANNEL_COUNT = 8
+STAND_IN_CONFIG_ID = "00000000-0000-0000-0000-000000000000"
+
+# Light attributes that may set the color of a palette entry. Exactly one is required per entry.
+PALETTE_COLOR_ATTRS = ["rgb_color", "color_temp", "kelvin"]
+
+PALETTE_ENTRY_SCHEMA = vol.Schema(
+    {
+        vol.Exclusive("rgb_color", "color"): vol.All(
+            [vol.All(int, vol.Range(min=0, max=255))], vol.Length(min=3, max=3), vol.Coerce(tuple)
+        ),
+        vol.Exclusive("color_temp", "color"): vol.All(int, vol.Range(min=1)),
+        vol.Exclusive("kelvin", "color"): vol.All(int, vol.Range(min=1)),
+        vol.Required("brightness"): vol.All(int, vol.Range(min=0, max=255)),
+        vol.Optional("weight", default=1): vol.All(int, vol.Range(min=1)),
+    }
+)
+
+SWARMS_SCHEMA = vol.Schema(
+    {
+        str: {
+            vol.Required("transition_secs"): vol.All(vol.Coerce(float), vol.Range(min=0, min_included=False)),
+            vol.Required("max_hold_secs"): vol.All(vol.Coerce(float), vol.Range(min=0)),
+            vol.Required("palette"): vol.All([PALETTE_ENTRY_SCHEMA], vol.Length(min=1)),
+        }
+    }
+)
+
+
+def _compile_swarms(swarm_defs):
+    """Convert validated swarm definitions into the form used by the swarm loop.
+
+    Weighted palette entries are expanded into repeated light argument dicts so that a uniform random choice
+    favors them.
+    """
+    swarms = {}
+    for swarm_name, swarm in swarm_defs.items():
+        palette = []
+        for entry in swarm["palette"]:
+            if not any(attr in entry for attr in PALETTE_COLOR_ATTRS):
+                raise ValueError(f"Palette entry in swarm '{swarm_name}' needs one of {PALETTE_COLOR_ATTRS}.")
+            light_args = {attr: value for attr, value in entry.items() if attr != "weight"}
+            palette += [light_args] * entry["weight"]
+        swarms[swarm_name] = {**swarm, "palette": palette}
+    return swarms
+
+
+def _swarms():
+    """Return the current swarm definitions, loading them on first use."""
+    return definitions.get(SWARMS_FILE, SWARMS_SCHEMA, _compile_swarms)
+
+
+@time_trigger("period(now, 30s)")
+def reload_swarms():
+    """Swap in edited swarm definitions without restarting running swarms."""
+    definitions.reload_if_changed(SWARMS_FILE, SWARMS_SCHEMA, _compile_swarms)
 
 
 def light_entities_for_group(group_name):
@@ -349,6 +95,11 @@ def light_entities_for_group(group_name):
     :param group_name: The Hue zone/room name exactly as it appears in the Hue app (e.g. "Living room").
     :return: Set of light entity IDs for the group name or empty set if no matching group or entities are found.
     """
+    # Imported here rather than at module load because they're only needed when a swarm starts.
+    from aiohue import HueBridgeV2
+    from aiohue.v2.models.resource import ResourceTypes
+    from homeassistant.helpers import entity_registry as er
+
     entity_ids = set()
 
     # Load entity registry.
@@ -374,29 +125,25 @@ def light_entities_for_group(group_name):
     return entity_ids
 
 
-@service
-def color_swarm_turn_on(hue_group_name="Office", swarm_name="Christmas"):
-    """Start the color swarm effect on the specified Philips Hue light group.
-
-    The color swarm comtinues running on the group until it is turned off or turned on with different parameters.
+def _apply_transition(entity_id, swarm, color):
+    """Transition one light to a palette color using the swarm's transition time.
 
-    :param hue_group_name: Name of the Hue light group or room, exactly as it appears in the Hue app. Case-sensitive.
-    :param swarm_name: The predefined swarm definition including color palette and transitions.
+    The command goes through the light dispatcher, so lights landing on the same color at the same moment share a
+    call.
     """
+    light_args = {
+        "entity_id": entity_id,
+        "transition": swarm["transition_secs"],
+        **color,
+    }
+    light_dispatch.turn_on(**light_args)
+    log.debug(f"Applied transition: {light_args}")
 
-    if swarm_name not in swarms:
-        raise ValueError(f"Swarm '{swarm_name}' does not exist.")
-    task.unique(f"color-swarm-{hue_group_name}")
-    entity_ids = light_entities_for_group(hue_group_name)
-    if entity_ids:
-        log.info(
-            f"Started '{swarm_name}' color swarm for Hue group '{hue_group_name}' consisting of {len(entity_ids)} light(s)."
-        )
-    else:
-        log.error(f"No light entities found for Hue group '{hue_group_name}'.")
+
+def _run_heap_swarm(swarm_name, swarm, entity_ids):
+    """Run a swarm by picking each light's next transition one at a time as the previous one is applied."""
 
     # Create a priority queue of the next transition per light, sorted by random future transition times.
-    swarm = swarms[swarm_name]
     transition_q = []
     start_time = time.monotonic()
     for entity_id in entity_ids:
@@ -407,23 +154,289 @@ def color_swarm_turn_on(hue_group_name="Office", swarm_name="Christmas"):
     # This will loop forever as long as there are lights and the task isn't killed.
     while transition_q:
         head_time, entity_id, head_color = heapq.heappop(transition_q)
+        # Follow edits to the definition, but keep going with the old one if the swarm was removed.
+        swarm = _swarms().get(swarm_name, swarm)
         now = time.monotonic()
         if head_time > now:
-            task.sleep(head_time - now)
-        light_args = {
-            "entity_id": entity_id,
-            "transition": swarm["transition_secs"],
-            **head_color,
-        }
-        light.turn_on(**light_args)
-        log.debug(f"Applied transition: {light_args}")
+            profiling.sleep(head_time - now)
+        if light_dispatch.is_claimed(entity_id):
+            # An alert is using this light. Hold the transition and try again shortly rather than overwrite the alert.
+            heapq.heappush(transition_q, (time.monotonic() + CLAIM_RECHECK_SECS, entity_id, head_color))
+            continue
+        _apply_transition(entity_id, swarm, head_color)
         now = time.monotonic()
         next_time = swarm["transition_secs"] + random.uniform(now, now + swarm["max_hold_secs"])
         next_color = random.choice(swarm["palette"])
         heapq.heappush(transition_q, (next_time, entity_id, next_color))
 
 
+@pyscript_compile
+def _new_transition_generator(seed, light_count, max_hold_secs):
+    """Create the random generator for precomputed transitions and draw the first transition time of each light.
+
+    :return: Tuple of the NumPy random generator and an array of first transition times in seconds from the start.
+    """
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    return rng, rng.uniform(0, max_hold_secs, size=light_count)
+
+
+@pyscript_compile
+def _draw_palette_indices(rng, count, palette_size):
+    """Draw random palette indices from the precomputed transition generator."""
+    return rng.integers(0, palette_size, size=count).tolist()
+
+
+@pyscript_compile
+def _precompute_transitions(rng, next_times, block_end, transition_secs, max_hold_secs, palette_size):
+    """Generate every light transition before the end of a block in one vectorized pass.
+
+    Like the heap engine, each light holds its color for the transition time plus a random hold of up to max_hold_secs
+    before its next transition. Times are in seconds from the start of the swarm.
+
+    :param rng: NumPy random generator.
+    :param next_times: Array of each light's next transition time that hasn't been generated yet.
+    :param block_end: Time at which to stop generating transitions.
+    :param transition_secs: Transition time of the swarm. Must be positive.
+    :param max_hold_secs: Maximum hold time of the swarm.
+    :param palette_size: Number of colors in the swarm's palette.
+    :return: Tuple of lists of transition times, light indices and palette indices, sorted by time, followed by the
+        array of each light's next transition time after the block.
+    """
+    import numpy as np
+
+    light_count = len(next_times)
+    # Each gap between transitions is at least transition_secs, so this many gaps always reach past the block end.
+    gap_count = max(int(np.ceil((block_end - next_times.min()) / transition_secs)), 0) + 1
+    gaps = transition_secs + rng.uniform(0, max_hold_secs, size=(light_count, gap_count))
+    times = next_times[:, None] + np.concatenate((np.zeros((light_count, 1)), np.cumsum(gaps, axis=1)), axis=1)
+    in_block = times < block_end
+    next_times = times[np.arange(light_count), in_block.sum(axis=1)]
+
+    block_times = times[in_block]
+    light_indices = np.broadcast_to(np.arange(light_count)[:, None], times.shape)[in_block]
+    order = np.argsort(block_times, kind="stable")
+    palette_indices = rng.integers(0, palette_size, size=len(block_times))
+    return block_times[order].tolist(), light_indices[order].tolist(), palette_indices.tolist(), next_times
+
+
+def _sleep_until(start_time, offset_secs):
+    """Sleep until the given number of seconds after the monotonic start time, unless that has already passed."""
+    now = time.monotonic() - start_time
+    if offset_secs > now:
+        profiling.sleep(offset_secs - now)
+
+
+def _run_precomputed_swarm(swarm_name, swarm, entity_ids, seed):
+    """Run a swarm from blocks of transitions generated ahead of time, which is cheaper for large groups.
+
+    The same seed and lights always produce the same sequence of transitions. Transitions on a light claimed by an
+    alert are held back and replayed in order, with their original spacing, once the light is free again.
+    """
+
+    # Sort the lights so that a seed maps to the same transitions regardless of set ordering.
+    entity_ids = sorted(entity_ids)
+    rng, next_times = task.executor(_new_transition_generator, seed, len(entity_ids), swarm["max_hold_secs"])
+    start_time = time.monotonic()
+    block_end = 0
+    # Transitions held back from each light while it's claimed, as (due time, color), by light index.
+    held = [[] for _ in entity_ids]
+    # Heap of (time, light index) at which lights with held transitions are next checked.
+    wakeups = []
+
+    # This will loop forever as long as there are lights and the task isn't killed.
+    while entity_ids:
+        # Follow edits to the definition between blocks, but keep going with the old one if the swarm was removed.
+        swarm = _swarms().get(swarm_name, swarm)
+        block_end += PRECOMPUTE_BLOCK_SECS
+        times, light_indices, palette_indices, next_times = task.executor(
+            _precompute_transitions,
+            rng,
+            next_times,
+            block_end,
+            swarm["transition_secs"],
+            swarm["max_hold_secs"],
+            len(swarm["palette"]),
+        )
+        position = 0
+        while position < len(times):
+            if wakeups and wakeups[0][0] <= times[position]:
+                wakeup_time, light_index = heapq.heappop(wakeups)
+                _sleep_until(start_time, wakeup_time)
+                if light_dispatch.is_claimed(entity_ids[light_index]):
+                    heapq.heappush(wakeups, (wakeup_time + CLAIM_RECHECK_SECS, light_index))
+                    continue
+                due_time, color = held[light_index].pop(0)
+                _apply_transition(entity_ids[light_index], swarm, color)
+                if held[light_index]:
+                    # Shift the rest of the held transitions by however long this one was held.
+                    heapq.heappush(wakeups, (held[light_index][0][0] + wakeup_time - due_time, light_index))
+                continue
+
+            change_time, light_index = times[position], light_indices[position]
+            color = swarm["palette"][palette_indices[position]]
+            position += 1
+            if held[light_index]:
+                # Queue behind the transitions already held back from this light.
+                held[light_index].append((change_time, color))
+                continue
+            _sleep_until(start_time, change_time)
+            if light_dispatch.is_claimed(entity_ids[light_index]):
+                # An alert is using this light. Hold the transition rather than overwrite the alert.
+                held[light_index].append((change_time, color))
+                heapq.heappush(wakeups, (change_time + CLAIM_RECHECK_SECS, light_index))
+                continue
+            _apply_transition(entity_ids[light_index], swarm, color)
+
+
+@service
+@profiling.profiled
+def color_swarm_turn_on(hue_group_name="Office", swarm_name="Christmas", engine="heap", seed=None):
+    """Start the color swarm effect on the specified Philips Hue light group.
+
+    The color swarm comtinues running on the group until it is turned off or turned on with different parameters.
+
+    :param hue_group_name: Name of the Hue light group or room, exactly as it appears in the Hue app. Case-sensitive.
+    :param swarm_name: The predefined swarm definition including color palette and transitions.
+    :param engine: "heap" picks each transition as it goes. "precomputed" generates blocks of transitions ahead of
+        time, which is cheaper for large groups and reproducible with a seed.
+    :param seed: Optional random seed for the "precomputed" engine.
+    """
+
+    if swarm_name not in _swarms():
+        raise ValueError(f"Swarm '{swarm_name}' does not exist.")
+    if engine not in ENGINES:
+        raise ValueError(f"Engine '{engine}' does not exist. Choose one of {ENGINES}.")
+    task.unique(f"color-swarm-{hue_group_name}")
+    entity_ids = light_entities_for_group(hue_group_name)
+    if entity_ids:
+        log.info(
+            f"Started '{swarm_name}' color swarm for Hue group '{hue_group_name}' consisting of {len(entity_ids)} light(s)."
+        )
+    else:
+        log.error(f"No light entities found for Hue group '{hue_group_name}'.")
+
+    swarm = _swarms()[swarm_name]
+    if engine == "precomputed":
+        _run_precomputed_swarm(swarm_name, swarm, entity_ids, seed)
+    else:
+        _run_heap_swarm(swarm_name, swarm, entity_ids)
+
+
+def _stream_swarm(stream, config_id, channel_ids, swarm_name, swarm, frame_rate, seed):
+    """Stream a swarm to an entertainment area at a fixed frame rate until the task is killed.
+
+    Channel transitions are scheduled the same way as the precomputed engine and rendered as smooth fades between
+    frames.
+    """
+    rng, next_times = task.executor(_new_transition_generator, seed, len(channel_ids), swarm["max_hold_secs"])
+    palette_colors = [hue_entertainment.palette_entry_rgb(entry) for entry in swarm["palette"]]
+    initial_indices = task.executor(_draw_palette_indices, rng, len(channel_ids), len(palette_colors))
+    channels = hue_entertainment.new_channels([palette_colors[index] for index in initial_indices])
+    timeline = {"times": [], "position": 0}
+    block_end = 0
+    frame_secs = 1 / frame_rate
+    frame_count = 0
+    start_time = time.monotonic()
+
+    while True:
+        now = time.monotonic() - start_time
+        if timeline["position"] == len(timeline["times"]):
+            # Follow edits to the definition between blocks, but keep going with the old one if it was removed.
+            swarm = _swarms().get(swarm_name, swarm)
+            palette_colors = [hue_entertainment.palette_entry_rgb(entry) for entry in swarm["palette"]]
+            block_end += PRECOMPUTE_BLOCK_SECS
+            times, indices, palette_indices, next_times = task.executor(
+                _precompute_transitions,
+                rng,
+                next_times,
+                block_end,
+                swarm["transition_secs"],
+                swarm["max_hold_secs"],
+                len(palette_colors),
+            )
+            colors = [palette_colors[index] for index in palette_indices]
+            timeline = {"times": times, "indices": indices, "colors": colors, "position": 0}
+        colors = hue_entertainment.render_frame(channels, timeline, now, swarm["transition_secs"])
+        stream.send(hue_entertainment.encode_frame(config_id, channel_ids, colors, frame_count))
+        frame_count += 1
+        # Sleep until the next frame is due, measured from the start so that the rate doesn't drift.
+        profiling.sleep(max(start_time + frame_count * frame_secs - time.monotonic(), 0))
+
+
+@service
+@profiling.profiled
+def color_swarm_stream_on(
+    entertainment_area="Office",
+    swarm_name="Candlelight",
+    client_key=None,
+    frame_rate=DEFAULT_FRAME_RATE,
+    seed=None,
+    stand_in=None,
+):
+    """Start the color swarm effect on a Philips Hue entertainment area by streaming colors to the bridge.
+
+    Streaming is much faster than the REST commands behind color_swarm_turn_on, so use it for swarms with short
+    transitions and holds. Every light in the area is driven, so they don't respond to other commands while the swarm
+    runs. Stop it with color_swarm_turn_off using the entertainment area name.
+
+    :param entertainment_area: Name of the entertainment area, exactly as it appears in the Hue app. Case-sensitive.
+    :param swarm_name: The predefined swarm definition including color palette and transitions.
+    :param client_key: Hex-encoded entertainment client key of the bridge, generated when the application key was.
+        Required unless streaming to a stand-in bridge.
+    :param frame_rate: Number of frames sent per second.
+    :param seed: Optional random seed, which makes the stream reproducible.
+    :param stand_in: "host:port" of a stand-in bridge that records frames. If set, the real bridge isn't contacted.
+    """
+
+    if swarm_name not in _swarms():
+        raise ValueError(f"Swarm '{swarm_name}' does not exist.")
+    if not 0 < frame_rate <= MAX_FRAME_RATE:
+        raise ValueError(f"Frame rate must be greater than 0 and at most {MAX_FRAME_RATE}.")
+    if stand_in is None and client_key is None:
+        raise ValueError("A client key is required to stream to a Hue bridge.")
+    task.unique(f"color-swarm-{entertainment_area}")
+
+    area = None
+    if stand_in is not None:
+        host, port = stand_in.rsplit(":", 1)
+        config_id, channel_ids = STAND_IN_CONFIG_ID, list(range(STAND_IN_CHANNEL_COUNT))
+    else:
+        area = hue_entertainment.find_area(entertainment_area)
+        if area is None:
+            log.error(f"No Hue entertainment area found named '{entertainment_area}'.")
+            return
+        config_id, channel_ids = area["config_id"], area["channel_ids"][: hue_entertainment.MAX_CHANNELS]
+        hue_entertainment.set_area_streaming(area, True)
+    # Streaming mode must be stopped even if the stream can't be opened, or the lights ignore other commands until
+    # the bridge gives up on the stream.
+    stream = None
+    try:
+        if area is None:
+            stream = task.executor(hue_entertainment.open_stream, host, int(port))
+        else:
+            stream = task.executor(
+                hue_entertainment.open_stream,
+                area["host"],
+                hue_entertainment.STREAM_PORT,
+                area["api_key"],
+                client_key,
+            )
+        log.info(
+            f"Streaming '{swarm_name}' color swarm to entertainment area '{entertainment_area}' with "
+            f"{len(channel_ids)} channel(s) at {frame_rate} frames/sec."
+        )
+        _stream_swarm(stream, config_id, channel_ids, swarm_name, _swarms()[swarm_name], frame_rate, seed)
+    finally:
+        if stream is not None:
+            stream.close()
+        if area is not None:
+            hue_entertainment.set_area_streaming(area, False)
+
+
 @service
+@profiling.profiled
 def color_swarm_turn_off(hue_group_name="Office"):
-    """Stop any running color swarm effect on the specified Philips Hue light group."""
+    """Stop any running color swarm effect on the specified Philips Hue light group or entertainment area."""
     task.unique(f"color-swarm-{hue_group_name}")
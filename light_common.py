@@ -1,6 +1,9 @@
 from hashlib import sha1
+import light_dispatch
+import profiling
 
 @service
+@profiling.profiled
 def flash_lights(entity_ids=[], rgb_color=[255, 50, 0], count=3, delay_sec=1.25):
     """Flash lights a specific color and then restore their original states.
     
@@ -13,14 +16,20 @@ def flash_lights(entity_ids=[], rgb_color=[255, 50, 0], count=3, delay_sec=1.25)
     # Create a scene by snapshotting the current entity states, using hash of the entities as scene name.
     snapshot_id = "snapshot_" + sha1(bytes(repr(light_entities), "utf-8")).hexdigest()
     task.unique("flash_lights_" + snapshot_id)
-    scene.create(scene_id=snapshot_id, snapshot_entities=light_entities)
-    # Alternate between the color and the original scene.
-    for _ in range(0, count):
-        for light_entity in light_entities:
-            light.turn_on(entity_id=light_entity, rgb_color=rgb_color, brightness=255)
-        task.sleep(delay_sec)
-        scene.turn_on(entity_id="scene." + snapshot_id)
-        task.sleep(delay_sec)
-    # Occasionally, light gets stuck in "flash" state. Reapply the scene one final time.
-    task.sleep(2)
-    scene.turn_on(entity_id="scene." + snapshot_id)
+    # Flashes are alerts: claim the lights so that ambient effects pause on them until the scene is restored.
+    light_dispatch.claim(light_entities)
+    try:
+        profiling.call("scene", "create", scene_id=snapshot_id, snapshot_entities=light_entities)
+        # Alternate between the color and the original scene.
+        for _ in range(0, count):
+            light_dispatch.turn_on(
+                entity_id=light_entities, rgb_color=rgb_color, brightness=255, priority=light_dispatch.PRIORITY_ALERT
+            )
+            profiling.sleep(delay_sec)
+            profiling.call("scene", "turn_on", entity_id="scene." + snapshot_id)
+            profiling.sleep(delay_sec)
+        # Occasionally, light gets stuck in "flash" state. Reapply the scene one final time.
+        profiling.sleep(2)
+        profiling.call("scene", "turn_on", entity_id="scene." + snapshot_id)
+    finally:
+        light_dispatch.release(light_entities)
@@ -0,0 +1,106 @@
+"""
+Loads definitions (swarms, schedules, etc.) from YAML files in the pyscript folder. Each file is validated and
+compiled once on first use and the result is cached until the file, or the schema or compile function the caller
+passes, changes. The latter happens when the calling script is reloaded after an edit. Scripts poll
+reload_if_changed() from a time trigger so that edits to a YAML file are swapped in without reloading the script
+itself, which would kill its running tasks.
+Pyscript must be configured to expose the "hass" global variable and allow all imports.
+"""
+import voluptuous as vol
+
+# Loaded definitions by file name. Values are dicts with the file's modification time, the schema and compile
+# function it was loaded with, and the compiled definitions.
+_loaded = {}
+
+
+@pyscript_compile
+def _modification_time(path):
+    """Return the modification time of a file. Blocking, so run it in an executor."""
+    import os
+
+    return os.stat(path).st_mtime
+
+
+@pyscript_compile
+def _read_yaml(path):
+    """Parse a YAML file. Blocking, so run it in an executor."""
+    import yaml
+
+    with open(path) as yaml_file:
+        try:
+            return yaml.safe_load(yaml_file)
+        except yaml.YAMLError as error:
+            raise ValueError(f"Invalid YAML: {error}") from error
+
+
+def _load(file_name, schema, compile_func):
+    """Read, validate and compile a definitions file.
+
+    :return: Tuple of the file's modification time and the compiled definitions.
+    """
+    path = hass.config.path("pyscript", file_name)
+    mtime = task.executor(_modification_time, path)
+    validated = schema(task.executor(_read_yaml, path))
+    return mtime, compile_func(validated) if compile_func else validated
+
+
+def _is_stale(loaded, schema, compile_func):
+    """Return True if definitions were loaded with a different schema or compile function than the given ones."""
+    return loaded["schema"] is not schema or loaded["compile_func"] is not compile_func
+
+
+def get(file_name, schema, compile_func=None):
+    """Return the compiled definitions from a YAML file in the pyscript folder, loading them on first use.
+
+    :param file_name: Name of the YAML file relative to the pyscript folder.
+    :param schema: Voluptuous schema that the file contents must match.
+    :param compile_func: Optional function that converts the validated contents into the form used by the caller.
+        It may raise ValueError if the contents are invalid in a way the schema can't express.
+    :return: Compiled definitions.
+    """
+    loaded = _loaded.get(file_name)
+    if loaded is None:
+        mtime, compiled = _load(file_name, schema, compile_func)
+        _loaded[file_name] = {"mtime": mtime, "schema": schema, "compile_func": compile_func, "compiled": compiled}
+        log.info(f"Loaded definitions from {file_name}.")
+    elif _is_stale(loaded, schema, compile_func):
+        # The calling script was reloaded. Keep the previous definitions if the new schema rejects the file.
+        reload_if_changed(file_name, schema, compile_func)
+    return _loaded[file_name]["compiled"]
+
+
+def reload_if_changed(file_name, schema, compile_func=None):
+    """Reload a definitions file if it or the given schema or compile function changed since it was last loaded.
+
+    If the modified file is invalid, the error is logged and the previous definitions stay in effect. Files that
+    haven't been loaded yet are left alone until they're first used.
+
+    :param file_name: Name of the YAML file relative to the pyscript folder.
+    :param schema: Voluptuous schema that the file contents must match, as passed to get().
+    :param compile_func: Optional compile function, as passed to get().
+    :return: True if new definitions were swapped in.
+    """
+    loaded = _loaded.get(file_name)
+    if loaded is None:
+        return False
+    try:
+        mtime = task.executor(_modification_time, hass.config.path("pyscript", file_name))
+    except OSError as error:
+        # Only report a missing file once rather than on every check.
+        if loaded["mtime"] is not None:
+            log.error(f"Keeping previous definitions from {file_name}: {error}")
+            loaded["mtime"] = None
+        return False
+    if mtime == loaded["mtime"] and not _is_stale(loaded, schema, compile_func):
+        return False
+    # Remember the modification time and functions even if the file turns out to be broken so it's only reported
+    # once.
+    loaded.update(mtime=mtime, schema=schema, compile_func=compile_func)
+    try:
+        _, compiled = _load(file_name, schema, compile_func)
+    except (OSError, ValueError, vol.Invalid) as error:
+        log.error(f"Keeping previous definitions from {file_name}: {error}")
+        return False
+    loaded["compiled"] = compiled
+    log.info(f"Reloaded definitions from {file_name}.")
+    return True
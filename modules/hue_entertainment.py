@@ -0,0 +1,171 @@
+"""
+Helpers for streaming colors to Philips Hue lights with the Entertainment API. The bridge accepts a stream of UDP
+frames, each holding a color for every channel (light) of an entertainment area, and applies them far faster than
+REST commands. Frames go over DTLS with a pre-shared client key, which needs the python-mbedtls package. A plain UDP
+stream can be sent to a stand-in bridge (see tools/hue_stand_in_bridge.py) for testing without a real bridge.
+Pyscript must be configured to expose the "hass" global variable and allow all imports.
+"""
+
+# UDP port of the entertainment stream on the bridge.
+STREAM_PORT = 2100
+# Protocol name and version at the start of every frame.
+FRAME_PROTOCOL = b"HueStream"
+FRAME_VERSION = (2, 0)
+# The bridge takes at most this many channels per frame.
+MAX_CHANNELS = 20
+# Color temperature range that the REST path clamps to, in Kelvin.
+MIN_KELVIN, MAX_KELVIN = 2000, 6500
+
+
+def find_area(area_name):
+    """Find a Hue entertainment area (configuration) by name on all configured Hue bridges.
+
+    :param area_name: Name of the entertainment area exactly as it appears in the Hue app.
+    :return: Dict with the bridge host and API key, the entertainment configuration ID and the sorted channel IDs,
+        or None if no area has that name.
+    """
+    from aiohue import HueBridgeV2
+
+    for config_entry in hass.config_entries.async_entries(domain="hue"):
+        host, api_key = config_entry.data["host"], config_entry.data["api_key"]
+        async with HueBridgeV2(host, api_key) as bridge:
+            for config in bridge.request("get", "clip/v2/resource/entertainment_configuration"):
+                if config.get("metadata", {}).get("name") != area_name:
+                    continue
+                channel_ids = sorted(channel["channel_id"] for channel in config["channels"])
+                log.debug(f"Found Hue entertainment area '{area_name}' on {host}; channels: {channel_ids}")
+                return {"host": host, "api_key": api_key, "config_id": config["id"], "channel_ids": channel_ids}
+    return None
+
+
+def set_area_streaming(area, active):
+    """Start or stop streaming mode for an entertainment area found with find_area().
+
+    The bridge only accepts frames for an area while it is streaming. Stopping hands the lights back to REST control.
+    """
+    from aiohue import HueBridgeV2
+
+    async with HueBridgeV2(area["host"], area["api_key"]) as bridge:
+        bridge.request(
+            "put",
+            f"clip/v2/resource/entertainment_configuration/{area['config_id']}",
+            json={"action": "start" if active else "stop"},
+        )
+
+
+@pyscript_compile
+def open_stream(host, port, identity=None, client_key=None):
+    """Open a connected socket for sending frames. Blocking, so run it in an executor.
+
+    :param host: Host of the bridge or stand-in bridge.
+    :param port: UDP port of the stream.
+    :param identity: Application key (API key) of the bridge. Required with client_key.
+    :param client_key: Hex-encoded entertainment client key of the bridge. If omitted, frames are sent as plain UDP,
+        which only a stand-in bridge accepts.
+    :return: Socket with a send() method.
+    """
+    import socket
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    if client_key is None:
+        sock.connect((host, port))
+        return sock
+
+    try:
+        from mbedtls import tls
+
+        dtls_config = tls.DTLSConfiguration(
+            ciphers=["TLS-PSK-WITH-AES-128-GCM-SHA256"],
+            pre_shared_key=(identity, bytes.fromhex(client_key)),
+            validate_certificates=False,
+        )
+        dtls_sock = tls.ClientContext(dtls_config).wrap_socket(sock, server_hostname=None)
+        dtls_sock.connect((host, port))
+        dtls_sock.do_handshake()
+    except Exception:
+        sock.close()
+        raise
+    return dtls_sock
+
+
+@pyscript_compile
+def palette_entry_rgb(entry):
+    """Convert a swarm palette entry to linear RGB values between 0 and 1, scaled by its brightness.
+
+    Color temperatures are treated the way the REST path treats them: color_temp is in mireds and kelvin is in
+    Kelvin, and both are clamped to the range the lights support.
+    """
+    import math
+
+    if "rgb_color" in entry:
+        rgb = [value / 255 for value in entry["rgb_color"]]
+    else:
+        kelvin = entry["kelvin"] if "kelvin" in entry else 1_000_000 / entry["color_temp"]
+        # Approximation of black body color by Tanner Helland, valid for the clamped range.
+        temp = min(max(kelvin, MIN_KELVIN), MAX_KELVIN) / 100
+        if temp <= 66:
+            red = 255
+            green = 99.4708025861 * math.log(temp) - 161.1195681661
+            blue = 138.5177312231 * math.log(temp - 10) - 305.0447927307
+        else:
+            red = 329.698727446 * (temp - 60) ** -0.1332047592
+            green = 288.1221695283 * (temp - 60) ** -0.0755148492
+            blue = 255
+        rgb = [min(max(value, 0), 255) / 255 for value in (red, green, blue)]
+    return tuple(value * entry["brightness"] / 255 for value in rgb)
+
+
+@pyscript_compile
+def new_channels(colors):
+    """Create the render state of each channel, starting at the given RGB colors."""
+    return [{"from": color, "to": color, "start": 0.0} for color in colors]
+
+
+@pyscript_compile
+def _channel_color(channel, now, transition_secs):
+    """Return a channel's color at the given time, part way through its current transition."""
+    progress = min(max((now - channel["start"]) / transition_secs, 0.0), 1.0)
+    return tuple(start + (end - start) * progress for start, end in zip(channel["from"], channel["to"]))
+
+
+@pyscript_compile
+def render_frame(channels, timeline, now, transition_secs):
+    """Start every transition in the timeline that is due and return each channel's color at the given time.
+
+    :param channels: Render state of each channel from new_channels(). Updated in place.
+    :param timeline: Dict with lists of transition "times", channel "indices" and RGB "colors" sorted by time, and
+        the "position" of the first transition that hasn't started yet. The position is advanced in place.
+    :param now: Current time in the same units as the timeline times.
+    :param transition_secs: Duration of each transition.
+    :return: List of RGB colors, one per channel.
+    """
+    times, position = timeline["times"], timeline["position"]
+    while position < len(times) and times[position] <= now:
+        channel = channels[timeline["indices"][position]]
+        channel["from"] = _channel_color(channel, times[position], transition_secs)
+        channel["to"] = timeline["colors"][position]
+        channel["start"] = times[position]
+        position += 1
+    timeline["position"] = position
+    return [_channel_color(channel, now, transition_secs) for channel in channels]
+
+
+@pyscript_compile
+def encode_frame(config_id, channel_ids, colors, sequence):
+    """Encode one frame of the entertainment stream in RGB color space.
+
+    :param config_id: Entertainment configuration ID (a UUID string).
+    :param channel_ids: Channel IDs, in the same order as colors.
+    :param colors: RGB values between 0 and 1 for each channel.
+    :param sequence: Frame sequence number. Only the low byte is sent.
+    :return: Frame bytes.
+    """
+    import struct
+
+    frame = bytearray(FRAME_PROTOCOL)
+    # Version, sequence number, two reserved bytes, RGB color space and one more reserved byte.
+    frame += bytes((*FRAME_VERSION, sequence & 0xFF, 0, 0, 0, 0))
+    frame += config_id.encode("ascii")
+    for channel_id, color in zip(channel_ids[:MAX_CHANNELS], colors):
+        frame += struct.pack(">BHHH", channel_id, *(round(min(max(value, 0.0), 1.0) * 0xFFFF) for value in color))
+    return bytes(frame)
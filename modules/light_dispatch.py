@@ -0,0 +1,530 @@
+"""
+Shared dispatcher for light.turn_on commands from all scripts. Commands are collected for a short flush window and
+commands with identical arguments are merged into one multi-entity light.turn_on call. That saves service calls and
+radio messages whenever several lights change the same way at the same moment, whether they belong to one effect
+(every bulb in a flash) or to different ones. If a light gets more than one command within a window, only the latest
+is sent. Each merged call is sent in its own task so a slow call doesn't hold up the others.
+
+Calls time out after a few seconds, and the health of each light is tracked with a circuit breaker. A light that
+keeps failing (or is unavailable) is skipped for a while and then probed with a single command, backing off further
+each time the probe fails, so one dead bulb can't slow down an entire effect. Only timeouts and communication errors
+count as failures; a command the light doesn't accept is logged and raised to the caller instead. Pyscript must be
+configured to expose the "hass" global variable and allow all imports.
+
+Commands have a priority. Alert commands are sent ahead of ambient ones whenever the bridge is busy, and an alert can
+claim lights while it runs: ambient commands for claimed lights are held back instead of overwriting the alert, and
+the latest one is sent when the claim is released. Ambient effects should check is_claimed() and pause transitions on
+claimed lights until they're free again.
+"""
+import asyncio
+import heapq
+import time
+from datetime import datetime, timezone
+from homeassistant.exceptions import HomeAssistantError, ServiceValidationError
+import profiling
+
+# Number of seconds to collect commands before sending them.
+FLUSH_WINDOW_SECS = 0.02
+# Number of seconds to wait for a call before treating it as failed.
+CALL_TIMEOUT_SECS = 3
+# Number of consecutive failures after which a light is skipped.
+FAILURE_THRESHOLD = 3
+# Number of seconds a failing light is skipped before it is probed, doubled after each failed probe up to the max.
+INITIAL_BACKOFF_SECS = 30
+MAX_BACKOFF_SECS = 900
+
+# Command priorities. Lower values are sent first.
+PRIORITY_ALERT = 0
+PRIORITY_AMBIENT = 1
+# Number of calls that may be in flight at once, which keeps the bridge's command rate free for alerts. Ambient calls
+# may only use all but one of them, so an alert always has a slot that ambient calls can't hold up.
+MAX_CALLS_IN_FLIGHT = 4
+
+# Circuit breaker states. Closed lights get commands, open lights are skipped and a half-open light has a single
+# probe command in flight.
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+# Entity that publishes how many commands were submitted and how many calls they were merged into.
+STATS_ENTITY_ID = "sensor.light_dispatch_calls"
+# Entity that publishes the number of skipped lights and the health of every light that has failed recently.
+HEALTH_ENTITY_ID = "sensor.light_dispatch_unhealthy_lights"
+# Minimum number of seconds between updates of each of these entities, so that fast effects and failing lights don't
+# make the recorder write a row for every flush or failure.
+PUBLISH_INTERVAL_SECS = 60
+
+# Commands waiting for the next flush, keyed by their priority and light arguments. Each batch is a dict with the
+# priority, the light arguments, the entity IDs to send them to, the profiled invocations that submitted the command
+# and the command generation for each entity ID, the entity ID it probes if it is a circuit breaker probe, an event that
+# is set once the call has been made, and the error it raised, if any.
+_pending_batches = {}
+# Key of the pending batch for each entity ID.
+_pending_keys = {}
+# Whether a flush task is waiting for the current window to end.
+_flush_scheduled = False
+# Running totals for the stats entity.
+_stats = {"commands": 0, "calls": 0, "skipped": 0}
+# Monotonic time each published entity was last updated, and the entities with an update waiting for the interval to
+# end, by entity ID.
+_published_at = {}
+_publish_scheduled = set()
+# Number of calls in flight and a heap of (priority, sequence, event) for sends waiting for a free slot.
+_calls_in_flight = 0
+_slot_waiters = []
+_slot_sequence = 0
+# Tasks holding a claim on each light, by entity ID.
+_claims = {}
+# Latest ambient light arguments held back from each claimed light, by entity ID.
+_held_back = {}
+# Number of commands accepted for each light, by entity ID. A failed call isn't retried for a light that has received a
+# newer command since.
+_generations = {}
+# Health of lights that have failed since their last success, by entity ID. Each is a dict with the circuit breaker
+# state, the number of consecutive failures, the current backoff and the monotonic time of the next probe.
+_health = {}
+
+
+def _args_key(light_args):
+    """Return a hashable key that is equal for identical light arguments."""
+    return tuple(
+        sorted((name, tuple(value) if isinstance(value, list) else value) for name, value in light_args.items())
+    )
+
+
+@pyscript_compile
+async def _call_turn_on(hass, entity_ids, light_args, timeout):
+    """Call light.turn_on and wait for it to complete, raising TimeoutError if it takes too long."""
+    await asyncio.wait_for(
+        hass.services.async_call("light", "turn_on", {"entity_id": entity_ids, **light_args}, blocking=True),
+        timeout,
+    )
+
+
+def _publish_later(entity_id, publish_func, delay_secs):
+    """Update a published entity after a delay."""
+    task.sleep(delay_secs)
+    _publish_scheduled.discard(entity_id)
+    _publish(entity_id, publish_func)
+
+
+def _publish(entity_id, publish_func):
+    """Update a published entity now, or at the end of the publish interval if it was updated recently.
+
+    Either way the entity ends up with the latest figures, which publish_func sets when it is called.
+    """
+    if entity_id in _publish_scheduled:
+        return
+    if entity_id in _published_at:
+        delay_secs = _published_at[entity_id] + PUBLISH_INTERVAL_SECS - time.monotonic()
+        if delay_secs > 0:
+            _publish_scheduled.add(entity_id)
+            task.create(_publish_later, entity_id, publish_func, delay_secs)
+            return
+    _published_at[entity_id] = time.monotonic()
+    publish_func()
+
+
+def _publish_health():
+    """Publish the health of lights that have failed recently, at most once per publish interval."""
+    _publish(HEALTH_ENTITY_ID, _set_health_state)
+
+
+def _set_health_state():
+    """Set the health entity to the health of lights that have failed recently."""
+    now = time.monotonic()
+    state.set(
+        HEALTH_ENTITY_ID,
+        sum(1 for health in _health.values() if health["state"] != CLOSED),
+        {
+            "friendly_name": "Light dispatch unhealthy lights",
+            "unit_of_measurement": "lights",
+            "lights": {
+                entity_id: {
+                    "state": health["state"],
+                    "failures": health["failures"],
+                    "retry_in_secs": max(round(health["retry_at"] - now), 0) if health["state"] == OPEN else None,
+                }
+                for entity_id, health in _health.items()
+            },
+        },
+    )
+
+
+def _record_failure(entity_id, reason):
+    """Count a failed command for a light and open its circuit if it keeps failing or a probe failed."""
+    health = _health.setdefault(entity_id, {"state": CLOSED, "failures": 0, "backoff_secs": 0, "retry_at": 0})
+    health["failures"] += 1
+    if health["state"] == HALF_OPEN:
+        health["backoff_secs"] = min(health["backoff_secs"] * 2, MAX_BACKOFF_SECS)
+    elif health["state"] == CLOSED and health["failures"] >= FAILURE_THRESHOLD:
+        health["backoff_secs"] = INITIAL_BACKOFF_SECS
+        log.warning(f"Skipping {entity_id} after {health['failures']} failures ({reason}).")
+    else:
+        # Still below the threshold, or a call that was already in flight when the circuit opened.
+        _publish_health()
+        return
+    health["state"] = OPEN
+    health["retry_at"] = time.monotonic() + health["backoff_secs"]
+    log.debug(f"Probing {entity_id} again in {health['backoff_secs']} seconds ({reason}).")
+    _publish_health()
+
+
+def _record_success(entity_id):
+    """Mark a light as healthy again."""
+    health = _health.pop(entity_id, None)
+    if health is not None:
+        if health["state"] != CLOSED:
+            log.info(f"{entity_id} is responding again.")
+        _publish_health()
+
+
+def _end_probe(entity_id):
+    """Let the next command probe a half-open light again, after a probe that said nothing about its health."""
+    health = _health.get(entity_id)
+    if health is not None and health["state"] == HALF_OPEN:
+        health["state"] = OPEN
+        health["retry_at"] = time.monotonic()
+        _publish_health()
+
+
+def _is_light_failure(error):
+    """Return True if a call error means the lights didn't respond, rather than that the command was invalid."""
+    if isinstance(error, asyncio.TimeoutError):
+        return True
+    return isinstance(error, HomeAssistantError) and not isinstance(error, ServiceValidationError)
+
+
+def _admit(entity_id):
+    """Decide whether a command should be sent to a light, based on its health.
+
+    A light whose circuit is open is skipped until its probe time, when one command is let through as the probe.
+    Lights that Home Assistant already reports as unavailable are skipped and count as failing.
+    """
+    health = _health.get(entity_id)
+    if health is not None and health["state"] != CLOSED:
+        if health["state"] == HALF_OPEN or time.monotonic() < health["retry_at"]:
+            return False
+        health["state"] = HALF_OPEN
+    if state.exist(entity_id) and state.get(entity_id) == "unavailable":
+        _record_failure(entity_id, "unavailable")
+        return False
+    return True
+
+
+def _slot_limit(priority):
+    """Return how many calls may be in flight for a send of the given priority to start. One slot is kept for alerts."""
+    return MAX_CALLS_IN_FLIGHT if priority == PRIORITY_ALERT else MAX_CALLS_IN_FLIGHT - 1
+
+
+def _grant_slots():
+    """Hand free call slots to waiting sends in order of priority, then in the order they asked."""
+    global _calls_in_flight
+
+    while _slot_waiters and _calls_in_flight < _slot_limit(_slot_waiters[0][0]):
+        _calls_in_flight += 1
+        heapq.heappop(_slot_waiters)[2].set()
+
+
+def _acquire_slot(priority):
+    """Wait for a free call slot. Ambient sends can't take the last slot, so an alert never waits behind them."""
+    global _slot_sequence
+
+    _slot_sequence += 1
+    slot_free = asyncio.Event()
+    waiter = (priority, _slot_sequence, slot_free)
+    heapq.heappush(_slot_waiters, waiter)
+    _grant_slots()
+    try:
+        slot_free.wait()
+    except asyncio.CancelledError:
+        if slot_free.is_set():
+            # The slot was handed over just before the cancellation, so pass it on.
+            _release_slot()
+        else:
+            _slot_waiters.remove(waiter)
+            heapq.heapify(_slot_waiters)
+        raise
+
+
+def _release_slot():
+    """Free a call slot and hand it to the highest priority waiting send that may take it."""
+    global _calls_in_flight
+
+    _calls_in_flight -= 1
+    _grant_slots()
+
+
+def _send(batch):
+    """Send one merged light.turn_on call, track the health of its lights and signal its completion."""
+    _acquire_slot(batch["priority"])
+    sent_at = datetime.now(timezone.utc)
+    try:
+        _call_turn_on(hass, batch["entity_ids"], batch["light_args"], CALL_TIMEOUT_SECS)
+        error = None
+    except Exception as call_error:
+        error = call_error
+    finally:
+        _release_slot()
+
+    try:
+        if error is None:
+            for entity_id in batch["entity_ids"]:
+                _record_success(entity_id)
+        elif not _is_light_failure(error):
+            # An invalid command fails the same way on every light, so it says nothing about their health.
+            log.warning(f"Failed to turn on {batch['entity_ids']} with {batch['light_args']}: {error!r}")
+            for entity_id in batch["entity_ids"]:
+                _end_probe(entity_id)
+            batch["error"] = error
+        elif len(batch["entity_ids"]) > 1:
+            batch["error"] = _find_failing_lights(batch, sent_at, error)
+        else:
+            reason = str(error) or type(error).__name__
+            log.warning(f"Failed to turn on {batch['entity_ids'][0]} with {batch['light_args']}: {reason}")
+            _record_failure(batch["entity_ids"][0], reason)
+            batch["error"] = error
+    finally:
+        batch["done"].set()
+
+
+def _batch_invocations(batch):
+    """Return the profiled invocations that submitted a batch's command to any of its lights, without duplicates."""
+    invocations = []
+    for entity_id in batch["entity_ids"]:
+        for invocation in batch["invocations"][entity_id]:
+            if not any(invocation is known for known in invocations):
+                invocations.append(invocation)
+    return invocations
+
+
+def _updated_since(entity_id, when):
+    """Return True if Home Assistant has received a state update for a light since the given UTC time."""
+    light_state = hass.states.get(entity_id)
+    return light_state is not None and light_state.last_updated >= when
+
+
+def _find_failing_lights(batch, sent_at, error):
+    """Work out which lights of a failed multi-light call are at fault, re-sending the command only where necessary.
+
+    A timeout doesn't mean that every light missed the command, and a light may have received a newer command since,
+    so the lights' states are checked first. Lights that have a newer command are left alone, lights reported as
+    unavailable count as failing, and lights whose state was updated after the call was sent have responded. Only the
+    remaining lights are retried, one at a time, so that only the ones that are actually failing are blamed.
+
+    :return: The error to report for the batch, or None if no light turned out to be failing.
+    """
+    reason = str(error) or type(error).__name__
+    failed = False
+    retry_entity_ids = []
+    for entity_id in batch["entity_ids"]:
+        if _generations.get(entity_id) != batch["generations"][entity_id]:
+            continue
+        if state.exist(entity_id) and state.get(entity_id) == "unavailable":
+            log.warning(f"Failed to turn on {entity_id} with {batch['light_args']}: {reason}")
+            _record_failure(entity_id, "unavailable")
+            failed = True
+        elif _updated_since(entity_id, sent_at):
+            _record_success(entity_id)
+        else:
+            retry_entity_ids.append(entity_id)
+    retry_error = _send_individually({**batch, "entity_ids": retry_entity_ids}) if retry_entity_ids else None
+    return error if failed else retry_error
+
+
+def _send_individually(batch):
+    """Send a batch's command to each of its lights in a separate call and wait for them all.
+
+    :return: The first error raised by any of the calls, or None.
+    """
+    single_batches = [
+        {**batch, "entity_ids": [entity_id], "done": asyncio.Event(), "error": None}
+        for entity_id in batch["entity_ids"]
+    ]
+    _stats["calls"] += len(single_batches)
+    for single_batch in single_batches:
+        profiling.count_call("light", _batch_invocations(single_batch))
+        task.create(_send, single_batch)
+    for single_batch in single_batches:
+        single_batch["done"].wait()
+    return next((single_batch["error"] for single_batch in single_batches if single_batch["error"]), None)
+
+
+def _flush():
+    """Wait for the flush window to end, then send every pending batch."""
+    global _flush_scheduled
+
+    task.sleep(FLUSH_WINDOW_SECS)
+    # Start alert calls first so that they get the free call slots.
+    pending_batches = list(_pending_batches.values())
+    batches = [batch for batch in pending_batches if batch["priority"] == PRIORITY_ALERT]
+    batches += [batch for batch in pending_batches if batch["priority"] != PRIORITY_ALERT]
+    _pending_batches.clear()
+    _pending_keys.clear()
+    _flush_scheduled = False
+
+    for batch in batches:
+        if batch["entity_ids"]:
+            _stats["calls"] += 1
+            profiling.count_call("light", _batch_invocations(batch))
+            task.create(_send, batch)
+        else:
+            # Every light in this batch got a later command or was claimed by an alert instead. A probe that isn't
+            # sent must not leave its light half-open, or the light would be skipped for good.
+            if batch["probe"] is not None:
+                _end_probe(batch["probe"])
+            batch["done"].set()
+    _publish_stats()
+
+
+def _publish_stats():
+    """Publish the running totals, at most once per publish interval."""
+    _publish(STATS_ENTITY_ID, _set_stats_state)
+
+
+def _set_stats_state():
+    """Set the stats entity to the running totals."""
+    state.set(
+        STATS_ENTITY_ID,
+        _stats["calls"],
+        {
+            "friendly_name": "Light dispatch calls",
+            "unit_of_measurement": "calls",
+            "state_class": "total_increasing",
+            "commands": _stats["commands"],
+            "skipped": _stats["skipped"],
+        },
+    )
+
+
+def _current_claimants(entity_id):
+    """Return the tasks claiming a light, forgetting any that have ended without releasing their claim."""
+    claimants = _claims.get(entity_id)
+    if claimants is None:
+        return set()
+    for claimant in [claimant for claimant in claimants if claimant.done()]:
+        claimants.discard(claimant)
+    if not claimants:
+        del _claims[entity_id]
+        _send_held_back(entity_id)
+    return claimants
+
+
+def _send_held_back(entity_id):
+    """Send the latest ambient command held back from a light that is no longer claimed."""
+    light_args = _held_back.pop(entity_id, None)
+    if light_args is not None:
+        turn_on(entity_id=entity_id, **light_args)
+
+
+def is_claimed(entity_id):
+    """Return True if an alert has claimed the light, in which case ambient effects should pause on it."""
+    return bool(_current_claimants(entity_id))
+
+
+def claim(entity_ids):
+    """Claim lights for the current task so that ambient commands don't overwrite an alert on them.
+
+    Ambient commands already waiting for the flush are held back along with any that follow. The claim ends with
+    release() or when the task ends.
+
+    :param entity_ids: List of light entity IDs.
+    """
+    current_task = asyncio.current_task()
+    for entity_id in entity_ids:
+        _claims.setdefault(entity_id, set()).add(current_task)
+        key = _pending_keys.get(entity_id)
+        if key is not None and _pending_batches[key]["priority"] == PRIORITY_AMBIENT:
+            _pending_batches[key]["entity_ids"].remove(entity_id)
+            del _pending_batches[key]["invocations"][entity_id]
+            del _pending_batches[key]["generations"][entity_id]
+            del _pending_keys[entity_id]
+            _held_back[entity_id] = _pending_batches[key]["light_args"]
+            # If the command was the light's probe, the next command probes it instead.
+            _end_probe(entity_id)
+
+
+def release(entity_ids):
+    """Release lights claimed by the current task and send the latest ambient command held back from each."""
+    current_task = asyncio.current_task()
+    for entity_id in entity_ids:
+        if entity_id in _claims:
+            _claims[entity_id].discard(current_task)
+            _current_claimants(entity_id)
+
+
+def turn_on(entity_id, wait=False, priority=PRIORITY_AMBIENT, **light_args):
+    """Submit a light.turn_on command to be merged with identical commands and sent at the end of the flush window.
+
+    Lights that are being skipped because they keep failing don't get the command. Ambient commands for claimed
+    lights are held back until the claim is released.
+
+    :param entity_id: Light entity ID or list of them.
+    :param wait: If True, wait until the calls carrying this command have been made and raise the first error, if any.
+    :param priority: PRIORITY_ALERT or PRIORITY_AMBIENT.
+    :param light_args: Other light.turn_on arguments, such as rgb_color, brightness and transition.
+    """
+    global _flush_scheduled
+
+    entity_ids = [entity_id] if isinstance(entity_id, str) else list(entity_id)
+    # The calls are made from the flush task, so remember which profiled services they are made for.
+    invocations = profiling.current_invocations()
+    args_key = (priority, _args_key(light_args))
+    batch_keys = []
+    for light_entity_id in entity_ids:
+        if priority == PRIORITY_AMBIENT and is_claimed(light_entity_id):
+            _generations[light_entity_id] = _generations.get(light_entity_id, 0) + 1
+            _held_back[light_entity_id] = light_args
+            continue
+        if not _admit(light_entity_id):
+            _stats["skipped"] += 1
+            continue
+        _generations[light_entity_id] = _generations.get(light_entity_id, 0) + 1
+        # Probes are sent on their own so that a failure is attributed to the right light without a retry.
+        probing = light_entity_id in _health and _health[light_entity_id]["state"] == HALF_OPEN
+        key = (args_key, light_entity_id) if probing else args_key
+        if key not in _pending_batches:
+            _pending_batches[key] = {
+                "priority": priority,
+                "light_args": light_args,
+                "entity_ids": [],
+                "invocations": {},
+                "generations": {},
+                "probe": light_entity_id if probing else None,
+                "done": asyncio.Event(),
+                "error": None,
+            }
+        if key not in batch_keys:
+            batch_keys.append(key)
+        # A later command for the same light supersedes the earlier one.
+        previous_key = _pending_keys.get(light_entity_id)
+        if previous_key == key:
+            # The same command is already pending, so the call carries it for both submitters.
+            _pending_batches[key]["invocations"][light_entity_id] += invocations
+            _pending_batches[key]["generations"][light_entity_id] = _generations[light_entity_id]
+            continue
+        if previous_key is not None:
+            _pending_batches[previous_key]["entity_ids"].remove(light_entity_id)
+            del _pending_batches[previous_key]["invocations"][light_entity_id]
+            del _pending_batches[previous_key]["generations"][light_entity_id]
+        _pending_batches[key]["entity_ids"].append(light_entity_id)
+        _pending_batches[key]["invocations"][light_entity_id] = list(invocations)
+        _pending_batches[key]["generations"][light_entity_id] = _generations[light_entity_id]
+        _pending_keys[light_entity_id] = key
+    if not batch_keys:
+        return
+    batches = [_pending_batches[key] for key in batch_keys]
+
+    _stats["commands"] += 1
+    if not _flush_scheduled:
+        _flush_scheduled = True
+        task.create(_flush)
+
+    if wait:
+        start_time = time.monotonic()
+        try:
+            for batch in batches:
+                batch["done"].wait()
+        finally:
+            profiling.count_wait(time.monotonic() - start_time)
+        error = next((batch["error"] for batch in batches if batch["error"]), None)
+        if error is not None:
+            raise error
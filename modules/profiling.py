@@ -0,0 +1,259 @@
+"""
+Per-service profiling. Decorate a service with @profiled (listed after @service) to record its invocation count, a
+histogram of its wall time, how much of that time it spends sleeping or waiting versus working, and how many Home
+Assistant services it calls per domain. Profiled code should use profiling.sleep() and profiling.wait_until() in place
+of task.sleep() and task.wait_until(), and profiling.acquire() to acquire locks, so that the time is counted as
+waiting rather than working. Other waits can be counted with profiling.count_wait(). Profiled code should also make
+its service calls with profiling.call() so that they are counted. Each service's figures are published as a
+sensor.pyscript_service_<name> entity and can be exported in Prometheus text format with prometheus_text().
+Pyscript must be configured to expose the "hass" global variable and allow all imports.
+"""
+import asyncio
+import functools
+import time
+
+# Upper bounds of the wall time histogram buckets, in seconds.
+DURATION_BUCKETS_SECS = [0.1, 0.5, 1, 5, 10, 30, 60, 300, 1800, float("inf")]
+
+# Keyword arguments that Pyscript adds when it calls a service function accepting **kwargs, as the profiled wrapper
+# does. The wrapped service doesn't expect them.
+PYSCRIPT_CALL_KWARGS = ["trigger_type", "context"]
+
+# Accumulated figures by service name.
+_stats = {}
+# Stacks of running profiled invocations by asyncio task. A profiled service may call another one directly, in
+# which case sleeps and downstream calls count towards both.
+_active = {}
+
+
+@pyscript_compile
+def _write_file(path, text):
+    """Write text to a file, creating its folder if necessary. Blocking, so run it in an executor."""
+    import os
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as text_file:
+        text_file.write(text)
+
+
+def _service_stats(name):
+    """Return the accumulated figures for a service, creating them if necessary."""
+    if name not in _stats:
+        _stats[name] = {
+            "invocations": 0,
+            "in_flight": 0,
+            "errors": 0,
+            "wall_secs": 0.0,
+            "sleep_secs": 0.0,
+            "bucket_counts": [0] * len(DURATION_BUCKETS_SECS),
+            "calls": {},
+        }
+    return _stats[name]
+
+
+def _publish(name, stats):
+    """Publish a service's figures as a sensor whose state is its invocation count."""
+    state.set(
+        f"sensor.pyscript_service_{name}",
+        stats["invocations"],
+        {
+            "friendly_name": f"Pyscript service {name}",
+            "unit_of_measurement": "invocations",
+            "state_class": "total_increasing",
+            "in_flight": stats["in_flight"],
+            "errors": stats["errors"],
+            "wall_secs": round(stats["wall_secs"], 3),
+            "sleep_secs": round(stats["sleep_secs"], 3),
+            "active_secs": round(stats["wall_secs"] - stats["sleep_secs"], 3),
+            "wall_secs_histogram": {
+                f"{bound:g}": count for bound, count in zip(DURATION_BUCKETS_SECS, stats["bucket_counts"])
+            },
+            "downstream_calls": dict(stats["calls"]),
+        },
+    )
+
+
+def count_wait(secs):
+    """Count time spent waiting as sleeping or waiting time of the profiled services running in this task.
+
+    Use it for waits other than sleep(), wait_until() and acquire(), such as waiting for another task to finish.
+    """
+    for invocation in _active.get(asyncio.current_task(), []):
+        invocation["sleep_secs"] += secs
+
+
+def profiled(func):
+    """Decorator that profiles every invocation of a service. List it after @service."""
+    name = func.__name__
+
+    @functools.wraps(func)
+    def profiled_func(*args, **kwargs):
+        stats = _service_stats(name)
+        stats["invocations"] += 1
+        stats["in_flight"] += 1
+        _publish(name, stats)
+        current_task = asyncio.current_task()
+        invocation = {"name": name, "sleep_secs": 0.0, "calls": {}, "finished": False}
+        _active.setdefault(current_task, []).append(invocation)
+        start_time = time.monotonic()
+        try:
+            return func(*args, **{key: value for key, value in kwargs.items() if key not in PYSCRIPT_CALL_KWARGS})
+        except Exception:
+            stats["errors"] += 1
+            raise
+        finally:
+            # Also runs when the task is killed (e.g. by task.unique), which is how long-running effects end.
+            wall_secs = time.monotonic() - start_time
+            _active[current_task].remove(invocation)
+            if not _active[current_task]:
+                del _active[current_task]
+            invocation["finished"] = True
+            stats["in_flight"] -= 1
+            stats["wall_secs"] += wall_secs
+            stats["sleep_secs"] += invocation["sleep_secs"]
+            for index, bound in enumerate(DURATION_BUCKETS_SECS):
+                if wall_secs <= bound:
+                    stats["bucket_counts"][index] += 1
+                    break
+            for domain, count in invocation["calls"].items():
+                stats["calls"][domain] = stats["calls"].get(domain, 0) + count
+            _publish(name, stats)
+
+    return profiled_func
+
+
+def sleep(secs):
+    """Same as task.sleep(), but counted as sleeping time of the profiled services running in this task."""
+    start_time = time.monotonic()
+    try:
+        task.sleep(secs)
+    finally:
+        count_wait(time.monotonic() - start_time)
+
+
+def wait_until(**kwargs):
+    """Same as task.wait_until(), but counted as sleeping time of the profiled services running in this task."""
+    start_time = time.monotonic()
+    try:
+        return task.wait_until(**kwargs)
+    finally:
+        count_wait(time.monotonic() - start_time)
+
+
+def acquire(lock):
+    """Same as lock.acquire(), but counted as waiting time of the profiled services running in this task."""
+    start_time = time.monotonic()
+    try:
+        lock.acquire()
+    finally:
+        count_wait(time.monotonic() - start_time)
+
+
+def call(domain, name, **kwargs):
+    """Same as service.call(), but counted as a downstream call of the profiled services running in this task."""
+    count_call(domain)
+    return service.call(domain, name, **kwargs)
+
+
+def current_invocations():
+    """Return the profiled invocations running in this task, for counting calls made on their behalf later."""
+    return list(_active.get(asyncio.current_task(), []))
+
+
+def count_call(domain, invocations=None):
+    """Count a Home Assistant service call made by the profiled services running in this task.
+
+    Calls made with call() are counted already. This is for calls made some other way, such as by a dispatcher.
+
+    :param domain: Domain of the called service.
+    :param invocations: Invocations from current_invocations() to count the call for instead, when it is made later
+        from another task, such as a dispatcher's. Calls made after an invocation finished still count towards its
+        service.
+    """
+    if invocations is None:
+        invocations = _active.get(asyncio.current_task(), [])
+    for invocation in invocations:
+        if invocation["finished"]:
+            stats = _service_stats(invocation["name"])
+            stats["calls"][domain] = stats["calls"].get(domain, 0) + 1
+            _publish(invocation["name"], stats)
+        else:
+            invocation["calls"][domain] = invocation["calls"].get(domain, 0) + 1
+
+
+def prometheus_text():
+    """Return the figures of all profiled services in Prometheus text exposition format."""
+    lines = []
+
+    def add_metric(metric_name, metric_type, help_text, samples):
+        lines.append(f"# HELP {metric_name} {help_text}")
+        lines.append(f"# TYPE {metric_name} {metric_type}")
+        for suffix, labels, value in samples:
+            label_text = ",".join(f'{label}="{label_value}"' for label, label_value in labels.items())
+            lines.append(f"{metric_name}{suffix}{{{label_text}}} {value}")
+
+    services = sorted(_stats.items())
+    add_metric(
+        "pyscript_service_invocations_total",
+        "counter",
+        "Number of times the service was invoked.",
+        [("", {"service": name}, stats["invocations"]) for name, stats in services],
+    )
+    add_metric(
+        "pyscript_service_errors_total",
+        "counter",
+        "Number of invocations that raised an error.",
+        [("", {"service": name}, stats["errors"]) for name, stats in services],
+    )
+    add_metric(
+        "pyscript_service_in_flight",
+        "gauge",
+        "Number of invocations currently running.",
+        [("", {"service": name}, stats["in_flight"]) for name, stats in services],
+    )
+    duration_samples = []
+    for name, stats in services:
+        cumulative_count = 0
+        for bound, count in zip(DURATION_BUCKETS_SECS, stats["bucket_counts"]):
+            cumulative_count += count
+            le = "+Inf" if bound == float("inf") else f"{bound:g}"
+            duration_samples.append(("_bucket", {"service": name, "le": le}, cumulative_count))
+        duration_samples.append(("_sum", {"service": name}, stats["wall_secs"]))
+        duration_samples.append(("_count", {"service": name}, cumulative_count))
+    add_metric(
+        "pyscript_service_duration_seconds",
+        "histogram",
+        "Wall time of completed invocations.",
+        duration_samples,
+    )
+    add_metric(
+        "pyscript_service_sleep_seconds_total",
+        "counter",
+        "Time completed invocations spent sleeping or waiting.",
+        [("", {"service": name}, stats["sleep_secs"]) for name, stats in services],
+    )
+    add_metric(
+        "pyscript_service_active_seconds_total",
+        "counter",
+        "Time completed invocations spent working rather than sleeping or waiting.",
+        [("", {"service": name}, stats["wall_secs"] - stats["sleep_secs"]) for name, stats in services],
+    )
+    add_metric(
+        "pyscript_service_downstream_calls_total",
+        "counter",
+        "Home Assistant service calls made by completed invocations or on their behalf, by domain.",
+        [
+            ("", {"service": name, "domain": domain}, count)
+            for name, stats in services
+            for domain, count in sorted(stats["calls"].items())
+        ],
+    )
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus_text(path):
+    """Write the figures of all profiled services in Prometheus text format to a file.
+
+    :param path: File path relative to the Home Assistant config folder.
+    """
+    task.executor(_write_file, hass.config.path(path), prometheus_text())
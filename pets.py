@@ -1,46 +1,175 @@
+"""
+Manage "feed pet" reminders on an Alexa to-do list. Pet food sensors are defined in pets.yaml. Pyscript must be
+configured to expose the "hass" global variable and allow all imports so that the file can be loaded and the Alexa
+command queue can use asyncio locks.
+"""
+import asyncio
+import voluptuous as vol
+import definitions
+import profiling
+
+# Pet food sensor definitions live in this YAML file in the pyscript folder.
+SENSORS_FILE = "pets.yaml"
 
 # Maps pet food container vibration sensors to todo item names and recently fed input booleans (helpers).
-SENSOR_MAPPINGS = {
-    "binary_sensor.cat_food_ias_zone": ("feed cats", "input_boolean.cat_recently_fed"),
-    "binary_sensor.dog_food_ias_zone": ("feed oakley", "input_boolean.dog_recently_fed"),
-}
+SENSORS_SCHEMA = vol.Schema(
+    {
+        vol.Match(r"^binary_sensor\."): {
+            vol.Required("todo_name"): str,
+            vol.Required("recently_fed_input_boolean"): vol.Match(r"^input_boolean\."),
+        }
+    }
+)
+
+# Alexa media player that runs the to-do list commands.
+ALEXA_MEDIA_PLAYER = "media_player.kitchen_echo_show"
+
+# Number of seconds to wait for the media player to start responding to a command. Many commands don't make the
+# media player change state at all, so this is the effective duration of those commands and must leave Alexa enough
+# time to finish speaking. Commands that do switch it to "playing" move on as soon as Alexa stops.
+ALEXA_COMMAND_START_TIMEOUT_SECS = 10
+# Number of seconds to wait for the media player to finish responding once it has started.
+ALEXA_COMMAND_FINISH_TIMEOUT_SECS = 10
+# Number of seconds to wait for the media player to report a new volume level.
+ALEXA_VOLUME_TIMEOUT_SECS = 5
+
+# Alexa volume level (between 0 and 1) while reminders are being set and the level to restore afterwards.
+REMINDER_VOLUME_LEVEL = 0.0
+NORMAL_VOLUME_LEVEL = 0.4
+
+# Per-media player locks that serialize command batches so that they never interleave.
+_command_locks = {}
+
+
+def _compile_sensor_mappings(sensor_defs):
+    """Convert validated sensor definitions to (todo name, recently fed input boolean) tuples by sensor ID."""
+    return {
+        entity_id: (sensor["todo_name"], sensor["recently_fed_input_boolean"])
+        for entity_id, sensor in sensor_defs.items()
+    }
+
+
+def _sensor_mappings():
+    """Return the current pet food sensor mappings, loading them on first use."""
+    return definitions.get(SENSORS_FILE, SENSORS_SCHEMA, _compile_sensor_mappings)
+
+
+@time_trigger("period(now, 30s)")
+def reload_pet_food_sensors():
+    """Swap in edited pet food sensor definitions."""
+    definitions.reload_if_changed(SENSORS_FILE, SENSORS_SCHEMA, _compile_sensor_mappings)
+
+
+def _command_lock(entity_id):
+    """Return the lock that serializes commands for the given media player, creating it if necessary."""
+
+    if entity_id not in _command_locks:
+        _command_locks[entity_id] = asyncio.Lock()
+    return _command_locks[entity_id]
+
 
+def _run_alexa_command(entity_id, command):
+    """Run given custom command on an Alexa media player and wait for it to complete.
 
-def _run_alexa_command(command):
-    """Run given custom command on Kitchen Echo Show and wait 10 seconds to complete."""
+    Completion is detected from the media player's state, which switches to "playing" while Alexa responds. If the
+    state never changes or Alexa takes too long to finish, we stop waiting after a timeout. The caller must hold the
+    media player's command lock.
+    """
 
-    media_player.play_media(
-        entity_id="media_player.kitchen_echo_show",
-        media_content_type="custom", 
+    profiling.call(
+        "media_player",
+        "play_media",
+        entity_id=entity_id,
+        media_content_type="custom",
         media_content_id=command
     )
-    task.sleep(10)
+    started = profiling.wait_until(
+        state_trigger=f"{entity_id} == 'playing'",
+        timeout=ALEXA_COMMAND_START_TIMEOUT_SECS,
+        state_check_now=False,
+    )
+    if started["trigger_type"] == "timeout":
+        log.debug(f"No response seen from {entity_id} for command '{command}'.")
+        return
+    finished = profiling.wait_until(
+        state_trigger=f"{entity_id} != 'playing'",
+        timeout=ALEXA_COMMAND_FINISH_TIMEOUT_SECS,
+    )
+    if finished["trigger_type"] == "timeout":
+        log.warning(f"Timed out waiting for {entity_id} to finish command '{command}'.")
+
+
+def _set_alexa_volume(entity_id, volume_level):
+    """Set the volume of an Alexa media player and wait until it reports the new level.
+
+    The caller must hold the media player's command lock.
+    """
+
+    profiling.call("media_player", "volume_set", entity_id=entity_id, volume_level=volume_level)
+    changed = profiling.wait_until(
+        state_trigger=f"{entity_id}.volume_level == {volume_level}",
+        timeout=ALEXA_VOLUME_TIMEOUT_SECS,
+    )
+    if changed["trigger_type"] == "timeout":
+        log.warning(f"Timed out waiting for {entity_id} to change volume to {volume_level}.")
+
+
+def _run_alexa_commands(commands, volume_level=None, entity_id=ALEXA_MEDIA_PLAYER):
+    """Run a batch of custom commands on an Alexa media player, one after the other.
+
+    Batches for the same media player are queued in the order they are requested and never interleave.
+
+    :param commands: List of custom commands to run.
+    :param volume_level: If set, change to this volume level before the batch and restore the normal level after it.
+    :param entity_id: Entity ID of the Alexa media player.
+    """
+    command_lock = _command_lock(entity_id)
+    # Time spent queued behind other batches is waiting, not work.
+    profiling.acquire(command_lock)
+    try:
+        if volume_level is not None:
+            _set_alexa_volume(entity_id, volume_level)
+        try:
+            for command in commands:
+                _run_alexa_command(entity_id, command)
+        finally:
+            if volume_level is not None:
+                _set_alexa_volume(entity_id, NORMAL_VOLUME_LEVEL)
+    finally:
+        command_lock.release()
 
 
 @service
+@profiling.profiled
 def clear_pet_food_reminder(entity_id):
     """Remove "feed pet" reminder from Alexa to-do list and set the recently fed boolean if it was unset.
 
     If the recently fed boolean was already set, do nothing.
 
-    :param entity_id: Entity ID of the sensor that was activated (from SENSOR_MAPPINGS).
+    :param entity_id: Entity ID of the sensor that was activated (from the sensors file).
     """
-    if entity_id not in SENSOR_MAPPINGS:
+    sensor_mappings = _sensor_mappings()
+    if entity_id not in sensor_mappings:
         raise ValueError(f"Not a pet food sensor: {entity_id}")
-    todo_name, recently_fed_input_boolean = SENSOR_MAPPINGS[entity_id]
+    todo_name, recently_fed_input_boolean = sensor_mappings[entity_id]
     if state.get(recently_fed_input_boolean) == "off":
-        _run_alexa_command(f"remove {todo_name} to my todo list")
         state.set(recently_fed_input_boolean, "on")
+        _run_alexa_commands([f"remove {todo_name} to my todo list"])
     else:
-        task.sleep(5)
+        profiling.sleep(5)
 
 
 @service
+@profiling.profiled
 def set_pet_food_reminders():
     """Add "feed pets" to Alexa to-do list and clear the recently fed booleans."""
 
-    _run_alexa_command("set volume 0")
-    for todo_name, recently_fed_input_boolean in SENSOR_MAPPINGS.values():
-        _run_alexa_command(f"add {todo_name} to my todo list")
+    # Clear the booleans before queueing the commands so that a pet fed while the reminders are still being added
+    # queues its removal behind them.
+    sensor_mappings = _sensor_mappings()
+    for _, recently_fed_input_boolean in sensor_mappings.values():
         state.set(recently_fed_input_boolean, "off")
-    _run_alexa_command("set volume 4")
\ No newline at end of file
+    _run_alexa_commands(
+        [f"add {todo_name} to my todo list" for todo_name, _ in sensor_mappings.values()],
+        volume_level=REMINDER_VOLUME_LEVEL,
+    )
@@ -1,4 +1,6 @@
 from datetime import datetime
+import light_dispatch
+import profiling
 
 FRONT_LIGHTS = ["light.front_door_east", "light.front_door_west"]
 
@@ -15,10 +17,16 @@ def upstairs_alerts_enabled():
 
 
 @service
+@profiling.profiled
 def front_door_alert():
     """Alert for front door motion."""
 
-    notify.ephemeral_notifications_group(title="Front door motion", message="There is motion at the front door.")
+    profiling.call(
+        "notify",
+        "ephemeral_notifications_group",
+        title="Front door motion",
+        message="There is motion at the front door.",
+    )
     light_entity_ids = [
         "light.tree_lamp_left",
         "light.table_north",
@@ -29,14 +37,20 @@ def front_door_alert():
     ]
     if upstairs_alerts_enabled():
         light_entity_ids += ["light.master_bath_mirror_left"]
-    pyscript.flash_lights(entity_ids=light_entity_ids, rgb_color=[255, 50, 0])
+    profiling.call("pyscript", "flash_lights", entity_ids=light_entity_ids, rgb_color=[255, 50, 0])
 
 
 @service
+@profiling.profiled
 def back_yard_alert():
     """Alert for back yard motion."""
 
-    notify.ephemeral_notifications_group(title="Backyard motion", message="There is motion in the back yard.")
+    profiling.call(
+        "notify",
+        "ephemeral_notifications_group",
+        title="Backyard motion",
+        message="There is motion in the back yard.",
+    )
     light_entity_ids=[
         "light.tree_lamp_right",
         "light.table_north",
@@ -47,24 +61,31 @@ def back_yard_alert():
     ]
     if upstairs_alerts_enabled():
         light_entity_ids += ["light.master_bath_mirror_right"]
-    pyscript.flash_lights(entity_ids=light_entity_ids, rgb_color=[77, 0, 255])
+    profiling.call("pyscript", "flash_lights", entity_ids=light_entity_ids, rgb_color=[77, 0, 255])
 
 
 @service
+@profiling.profiled
 def front_door_flood():
     """Turn on front door lights if off."""
 
     if light.outside == "off":
         def color_lights(rgb_color):
-            for light_entity in FRONT_LIGHTS:
-                light.turn_on(entity_id=light_entity, rgb_color=rgb_color, brightness=255)
-            task.sleep(2)
-        color_lights([255, 253, 253])
-        color_lights([255, 45, 43])
-        color_lights([255, 253, 253])
+            light_dispatch.turn_on(
+                entity_id=FRONT_LIGHTS, rgb_color=rgb_color, brightness=255, priority=light_dispatch.PRIORITY_ALERT
+            )
+            profiling.sleep(2)
+        light_dispatch.claim(FRONT_LIGHTS)
+        try:
+            color_lights([255, 253, 253])
+            color_lights([255, 45, 43])
+            color_lights([255, 253, 253])
+        finally:
+            light_dispatch.release(FRONT_LIGHTS)
 
 
 @service
+@profiling.profiled
 def front_door_end_flood():
     """Turn off front door lights if flooding."""
 
@@ -78,4 +99,4 @@ def front_door_end_flood():
     ]
     # If all front door lights are in the flood state, turn them off.
     if light.outside == "on" and all(lights_flooding):
-        light.turn_off(entity_id="light.outside")
+        profiling.call("light", "turn_off", entity_id="light.outside")
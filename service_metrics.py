@@ -0,0 +1,15 @@
+"""
+Export the service profiling figures recorded by the profiling module in Prometheus text format. The file is written
+to the www folder, which Home Assistant serves at /local/ without authentication so that Prometheus can scrape it.
+"""
+import profiling
+
+# Metrics file, relative to the Home Assistant config folder.
+METRICS_FILE = "www/pyscript_metrics.prom"
+
+
+@time_trigger("period(now, 60s)")
+@service
+def dump_service_metrics():
+    """Write profiling figures of all profiled services in Prometheus text format to the metrics file."""
+    profiling.write_prometheus_text(METRICS_FILE)
@@ -0,0 +1,146 @@
+"""
+Stand-in for a Philips Hue bridge's entertainment stream that records the frames it receives. It accepts the plain UDP
+frames that color_swarm_stream_on sends when given stand_in="host:port", so a swarm stream can be checked without a
+real bridge. This is a standalone script for use outside Home Assistant, not a Pyscript module.
+
+Run it and write each decoded frame to a JSON lines file:
+
+    python tools/hue_stand_in_bridge.py --port 2100 --output frames.jsonl
+
+Or use StandInBridge from Python to collect frames in memory.
+"""
+import argparse
+import json
+import socket
+import struct
+import threading
+import time
+
+# Frame layout: protocol name, version, sequence, reserved, color space, reserved, configuration ID, then channels.
+FRAME_PROTOCOL = b"HueStream"
+HEADER_LENGTH = 16
+CONFIG_ID_LENGTH = 36
+CHANNEL_LENGTH = 7
+
+
+def decode_frame(data):
+    """Decode one entertainment stream frame.
+
+    :param data: Frame bytes.
+    :return: Dict with the version, sequence number, color space, configuration ID and a dict of channel IDs to
+        16-bit color values.
+    :raise ValueError: If the data isn't a valid frame.
+    """
+    if not data.startswith(FRAME_PROTOCOL) or len(data) < HEADER_LENGTH + CONFIG_ID_LENGTH:
+        raise ValueError("Not a HueStream frame.")
+    channel_data = data[HEADER_LENGTH + CONFIG_ID_LENGTH :]
+    if len(channel_data) % CHANNEL_LENGTH:
+        raise ValueError(f"Channel data length {len(channel_data)} isn't a multiple of {CHANNEL_LENGTH}.")
+    channels = {}
+    for offset in range(0, len(channel_data), CHANNEL_LENGTH):
+        channel_id, *color = struct.unpack_from(">BHHH", channel_data, offset)
+        channels[channel_id] = color
+    return {
+        "version": (data[9], data[10]),
+        "sequence": data[11],
+        "color_space": "rgb" if data[14] == 0 else "xy",
+        "config_id": data[HEADER_LENGTH : HEADER_LENGTH + CONFIG_ID_LENGTH].decode("ascii"),
+        "channels": channels,
+    }
+
+
+class StandInBridge:
+    """Receives entertainment stream frames on a UDP port in a background thread and records them.
+
+    Each recorded frame is a decoded frame dict with an added "received" monotonic timestamp. Invalid frames are
+    counted but not recorded.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, on_frame=None):
+        """Bind the UDP socket. Port 0 picks a free port; see the port attribute.
+
+        :param on_frame: Optional function called with each recorded frame.
+        """
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._sock.bind((host, port))
+        self._sock.settimeout(0.2)
+        self.host, self.port = self._sock.getsockname()
+        self.frames = []
+        self.invalid_frame_count = 0
+        self._on_frame = on_frame
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(target=self._receive, daemon=True)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def start(self):
+        """Start recording frames."""
+        self._thread.start()
+
+    def stop(self):
+        """Stop recording frames and close the socket."""
+        self._stopping.set()
+        self._thread.join()
+        self._sock.close()
+
+    def frame_rate(self):
+        """Return the average number of frames received per second, or 0 if there aren't enough frames."""
+        if len(self.frames) < 2:
+            return 0
+        return (len(self.frames) - 1) / (self.frames[-1]["received"] - self.frames[0]["received"])
+
+    def _receive(self):
+        while not self._stopping.is_set():
+            try:
+                data = self._sock.recv(4096)
+            except socket.timeout:
+                continue
+            try:
+                frame = decode_frame(data)
+            except ValueError:
+                self.invalid_frame_count += 1
+                continue
+            frame["received"] = time.monotonic()
+            self.frames.append(frame)
+            if self._on_frame:
+                self._on_frame(frame)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--host", default="0.0.0.0", help="Address to listen on.")
+    parser.add_argument("--port", type=int, default=2100, help="UDP port to listen on.")
+    parser.add_argument("--output", help="JSON lines file to write each frame to. Frames are only counted if omitted.")
+    args = parser.parse_args()
+
+    output = open(args.output, "w") if args.output else None
+
+    def write_frame(frame):
+        if output:
+            output.write(json.dumps(frame) + "\n")
+
+    bridge = StandInBridge(args.host, args.port, on_frame=write_frame)
+    print(f"Recording frames on {bridge.host}:{bridge.port}. Press Ctrl-C to stop.")
+    bridge.start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        bridge.stop()
+        if output:
+            output.close()
+    print(
+        f"Received {len(bridge.frames)} frame(s) at {bridge.frame_rate():.1f} frames/sec; "
+        f"{bridge.invalid_frame_count} invalid."
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,8 @@
 import re
+import profiling
 
 @service
+@profiling.profiled
 def approaching_neighborhood_alert(entity_id=None):
     """Notify about someone approaching the neighborhood.
     
@@ -8,14 +10,17 @@ def approaching_neighborhood_alert(entity_id=None):
     # Send a notification for this person at most once every 20 minutes.
     task.unique("approaching_neighborhood_alert_" + entity_id)
     friendly_name = state.get(entity_id + ".friendly_name")
-    notify.ephemeral_notifications_group(
+    profiling.call(
+        "notify",
+        "ephemeral_notifications_group",
         title="Approaching neighborhood", 
         message=f"{friendly_name} is nearly home."
     )
-    task.sleep(1200)  # Don't notify again for awhile to account for GPS jitter, etc.
+    profiling.sleep(1200)  # Don't notify again for awhile to account for GPS jitter, etc.
 
 
 @service
+@profiling.profiled
 def conditional_driving_alert(entity_id=None):
     """Notify that someone appears to have started driving if and only if their matching notification flag is set.
     
@@ -30,13 +35,17 @@ def conditional_driving_alert(entity_id=None):
     notification_input_boolean_id = f"input_boolean.{person_name}_driving_notification_requested"
     if state.get(notification_input_boolean_id) == "on":
         # Turn off switch and send notifications.
-        input_boolean.turn_off(entity_id=notification_input_boolean_id)
+        profiling.call("input_boolean", "turn_off", entity_id=notification_input_boolean_id)
         friendly_name = state.get(person_id + ".friendly_name")
-        notify.ephemeral_notifications_group(
+        profiling.call(
+            "notify",
+            "ephemeral_notifications_group",
             title="Driving detected", 
             message=f"{friendly_name} has started driving."
         )
-        notify.mobile_notifications_high_priority_group(
+        profiling.call(
+            "notify",
+            "mobile_notifications_high_priority_group",
             title="Driving detected", 
             message=f"{friendly_name} has started driving."
         )